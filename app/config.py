@@ -8,6 +8,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 DATA_DIR = BASE_DIR / "data"
 PHOTOS_DIR = DATA_DIR / "photos"
 TMP_DIR = DATA_DIR / "tmp"
+THUMBS_DIR = DATA_DIR / "thumbs"
 DB_PATH = DATA_DIR / "app.db"
 CONFIG_FILE = DATA_DIR / "config.json"
 
@@ -22,6 +23,15 @@ _settings: Dict[str, float] = {
 
 # Thumbnail defaults
 DEFAULT_THUMB_WIDTH = 256
+# Rendered thumbnails/face crops kept on disk before the oldest are evicted
+THUMB_CACHE_MAX_FILES = int(os.getenv("THUMB_CACHE_MAX_FILES", "20000"))
+
+# Photos decoded/embedded concurrently by the processor's detect workers.
+# PIL decoding and ONNX Runtime inference release the GIL; each ONNX session
+# gets a matching share of the cores (see FaceEngine._share_cpu_threads).
+DETECT_WORKERS = max(1, min(4, os.cpu_count() or 1))
+# Longest side JPEGs are decoded at for face detection (0 = full resolution)
+DETECT_MAX_SIDE = int(os.getenv("DETECT_MAX_SIDE", "1600"))
 
 # Status polling interval hint for frontend
 POLL_INTERVAL_SECONDS = 1.0
@@ -31,6 +41,7 @@ def ensure_dirs() -> None:
     DATA_DIR.mkdir(parents=True, exist_ok=True)
     PHOTOS_DIR.mkdir(parents=True, exist_ok=True)
     TMP_DIR.mkdir(parents=True, exist_ok=True)
+    THUMBS_DIR.mkdir(parents=True, exist_ok=True)
     _load_settings()
 
 
@@ -1,20 +1,91 @@
 import json
 import sqlite3
+import struct
 import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Iterable, List, Optional, Tuple
+from typing import Iterable, Iterator, List, Optional, Sequence, Set, Tuple, Union
+
+import numpy as np
 
 from .config import DB_PATH, ensure_dirs
 
+# Statements issued on hot paths (polling, thumbnails, ingest). Keeping them as
+# module constants means every call hands sqlite3 the same string, so its
+# statement cache reuses the prepared statement instead of reparsing.
+_SQL_INSERT_PHOTO = """
+    INSERT OR REPLACE INTO photos (photo_id, file_path, orig_name, width, height, no_face)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+_SQL_INSERT_FACE = """
+    INSERT INTO faces (photo_id, embedding, bbox, model_type, emb_dtype, emb_row, emb_gen)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+_SQL_PHOTO_PATH = "SELECT file_path FROM photos WHERE photo_id = ?"
+_SQL_PHOTO_META = "SELECT file_path, orig_name FROM photos WHERE photo_id = ?"
+_SQL_UPDATE_GROUP = "UPDATE faces SET group_id = ? WHERE id = ?"
+
+# Prepared statements kept by sqlite3 per connection (its default is 128).
+_CACHED_STATEMENTS = 256
+
+# remove_missing_files: parallel stat() calls and ids per DELETE statement
+_STAT_WORKERS = 32
+_DELETE_BATCH = 500
+
+
+# bbox as four little-endian int32 (x1, y1, x2, y2): 16 bytes, no text formatting
+_BBOX = struct.Struct("<4i")
+
+
+def encode_bbox(bbox: Sequence[int]) -> bytes:
+    return _BBOX.pack(*bbox)
+
+
+def decode_bbox(value: Union[bytes, str, None]) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Inverse of encode_bbox; also reads the JSON text older databases stored.
+    Returns None for a missing or malformed bbox.
+    """
+    if isinstance(value, bytes):
+        return _BBOX.unpack(value) if len(value) == _BBOX.size else None
+    try:
+        bbox = json.loads(value) if value else None
+    except ValueError:
+        return None
+    if not isinstance(bbox, list) or len(bbox) != 4:
+        return None
+    return tuple(int(v) for v in bbox)
+
 
 class Database:
     def __init__(self, path: Path = DB_PATH) -> None:
         ensure_dirs()
         self.path = path
+        # append-only embedding files, one per (model_type, emb_dtype), that
+        # clustering memory-maps instead of decoding BLOBs
+        self.embeddings_dir = Path(path).parent / "embeddings"
+        self.embeddings_dir.mkdir(parents=True, exist_ok=True)
         self._lock = threading.Lock()
-        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._tx_depth = 0
+        # photo_ids known to the db, loaded on first photo_exists() call
+        self._photo_ids: Optional[Set[str]] = None
+        # list_groups_with_cover() result, dropped whenever group ids change
+        self._groups_cache: Optional[List[Tuple[str, int, int, str, Union[bytes, str]]]] = None
+        self._conn = sqlite3.connect(
+            self.path,
+            check_same_thread=False,
+            cached_statements=_CACHED_STATEMENTS,
+        )
         self._conn.execute("PRAGMA journal_mode=WAL;")
         self._conn.execute("PRAGMA synchronous=NORMAL;")
+        # per-connection tuning: read pages via mmap (256 MiB), keep sort/GROUP BY
+        # temporaries in RAM, 64 MiB page cache, fewer checkpoints during ingest
+        self._conn.execute("PRAGMA mmap_size=268435456;")
+        self._conn.execute("PRAGMA temp_store=MEMORY;")
+        self._conn.execute("PRAGMA cache_size=-65536;")
+        self._conn.execute("PRAGMA wal_autocheckpoint=10000;")
         self._ensure_schema()
 
     def _ensure_schema(self) -> None:
@@ -34,13 +105,86 @@ class Database:
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     photo_id TEXT NOT NULL,
                     embedding BLOB NOT NULL,
-                    bbox TEXT NOT NULL,
+                    emb_dtype TEXT NOT NULL DEFAULT 'float32',
+                    bbox BLOB NOT NULL,
                     model_type TEXT NOT NULL,
                     group_id TEXT,
                     FOREIGN KEY(photo_id) REFERENCES photos(photo_id) ON DELETE CASCADE
                 );
+                -- (group_id, photo_id) covers group listings and per-group photo lookups
+                CREATE INDEX IF NOT EXISTS idx_faces_group_photo ON faces(group_id, photo_id);
+                -- (group_id, id) finds a group's earliest face (its cover) without a sort
+                CREATE INDEX IF NOT EXISTS idx_faces_group_id ON faces(group_id, id);
+                CREATE INDEX IF NOT EXISTS idx_faces_photo ON faces(photo_id);
+                CREATE INDEX IF NOT EXISTS idx_faces_model ON faces(model_type);
                 """
             )
+            # databases created before embeddings were quantized hold float32 only
+            self._ensure_column("faces", "emb_dtype", "TEXT NOT NULL DEFAULT 'float32'")
+            # row index into the embeddings sidecar file; NULL for older rows
+            self._ensure_column("faces", "emb_row", "INTEGER")
+            # generation of the sidecar file emb_row points into (see _sidecar_generation)
+            self._ensure_column("faces", "emb_gen", "TEXT")
+
+    def _ensure_column(self, table: str, column: str, decl: str) -> None:
+        columns = {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+        if column not in columns:
+            self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+    @contextmanager
+    def _write(self) -> Iterator[None]:
+        """
+        Hold the lock for a write; commit right away unless a transaction is open.
+        """
+        with self._lock:
+            if self._tx_depth:
+                yield
+            else:
+                with self._conn:
+                    yield
+
+    def begin(self) -> None:
+        """
+        Start (or join) an explicit transaction; writes are held until commit().
+        """
+        with self._lock:
+            self._tx_depth += 1
+
+    def commit(self) -> None:
+        with self._lock:
+            self._tx_depth -= 1
+            if self._tx_depth == 0:
+                try:
+                    self._conn.commit()
+                except BaseException:
+                    # don't leave the batch pending for the next write to commit
+                    self._rollback_locked()
+                    raise
+
+    def rollback(self) -> None:
+        with self._lock:
+            self._tx_depth -= 1
+            if self._tx_depth == 0:
+                self._rollback_locked()
+
+    def _rollback_locked(self) -> None:
+        self._conn.rollback()
+        # the caches may hold rows that were just rolled back
+        self._photo_ids = None
+        self._groups_cache = None
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Run a block of writes as one transaction, so SQLite syncs once at the end.
+        """
+        self.begin()
+        try:
+            yield
+        except BaseException:
+            self.rollback()
+            raise
+        self.commit()
 
     def add_photo(
         self,
@@ -51,54 +195,235 @@ class Database:
         height: int,
         no_face: bool,
     ) -> None:
-        with self._lock, self._conn:
+        with self._write():
             self._conn.execute(
-                """
-                INSERT OR REPLACE INTO photos (photo_id, file_path, orig_name, width, height, no_face)
-                VALUES (?, ?, ?, ?, ?, ?)
-                """,
+                _SQL_INSERT_PHOTO,
                 (photo_id, file_path, orig_name, width, height, int(no_face)),
             )
+            if self._photo_ids is not None:
+                self._photo_ids.add(photo_id)
 
     def add_faces(
         self,
         photo_id: str,
-        faces: Iterable[Tuple[bytes, str, str]],
+        faces: Iterable[Tuple[bytes, bytes, str, str]],
     ) -> None:
         """
-        faces: iterable of (embedding_bytes, bbox_json, model_type)
+        faces: iterable of (embedding_bytes, bbox_bytes, model_type, emb_dtype)
         """
-        with self._lock, self._conn:
+        with self._write():
+            self._insert_faces([(photo_id, emb, bbox, model, dtype) for emb, bbox, model, dtype in faces])
+
+    def bulk_ingest(
+        self,
+        photos: Iterable[Tuple[str, str, str, int, int, bool]],
+        faces: Iterable[Tuple[str, bytes, bytes, str, str]],
+    ) -> None:
+        """
+        photos: iterable of (photo_id, file_path, orig_name, width, height, no_face)
+        faces: iterable of (photo_id, embedding_bytes, bbox_bytes, model_type, emb_dtype)
+        Both are written with one executemany each, in a single transaction.
+        """
+        photos = list(photos)
+        with self._write():
             self._conn.executemany(
-                """
-                INSERT INTO faces (photo_id, embedding, bbox, model_type)
-                VALUES (?, ?, ?, ?)
-                """,
-                ((photo_id, emb, bbox, model) for emb, bbox, model in faces),
+                _SQL_INSERT_PHOTO,
+                (
+                    (photo_id, file_path, orig_name, width, height, int(no_face))
+                    for photo_id, file_path, orig_name, width, height, no_face in photos
+                ),
             )
+            self._insert_faces(list(faces))
+            if self._photo_ids is not None:
+                self._photo_ids.update(row[0] for row in photos)
+
+    def _insert_faces(self, faces: List[Tuple[str, bytes, bytes, str, str]]) -> None:
+        """
+        faces: list of (photo_id, embedding_bytes, bbox_bytes, model_type, emb_dtype)
+        Appends embeddings to their sidecar file, then inserts rows pointing at them.
+        Must be called while holding the lock.
+        """
+        refs: List[Tuple[int, str]] = [(0, "")] * len(faces)
+        by_file: dict = {}
+        for i, face in enumerate(faces):
+            by_file.setdefault((face[3], face[4]), []).append(i)
+        for (model_type, dtype), indexes in by_file.items():
+            start, generation = self._append_embeddings(model_type, dtype, [faces[i][1] for i in indexes])
+            for offset, i in enumerate(indexes):
+                refs[i] = (start + offset, generation)
+        self._conn.executemany(
+            _SQL_INSERT_FACE,
+            (face + ref for face, ref in zip(faces, refs)),
+        )
+
+    def _sidecar_path(self, model_type: str, dtype: str) -> Path:
+        return self.embeddings_dir / f"{model_type}.{dtype}"
+
+    def _sidecar_generation(self, model_type: str, dtype: str, start_new: bool = False) -> Optional[str]:
+        """
+        Id written next to a sidecar file when it is started. Rows record it, so
+        rows from a deleted or replaced file are never read from its successor.
+        With start_new, a missing id (or data file) starts a fresh, empty file.
+        """
+        path = self._sidecar_path(model_type, dtype)
+        id_path = path.with_name(path.name + ".gen")
+        try:
+            if path.exists():
+                return id_path.read_text(encoding="ascii").strip()
+        except OSError:
+            pass
+        if not start_new:
+            return None
+        generation = uuid.uuid4().hex
+        self.embeddings_dir.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"")
+        id_path.write_text(generation, encoding="ascii")
+        return generation
+
+    def _append_embeddings(self, model_type: str, dtype: str, blobs: List[bytes]) -> Tuple[int, str]:
+        """
+        Append equally sized embedding rows; returns (row index of the first,
+        file generation). Rows orphaned by a rolled-back transaction are simply
+        never referenced.
+        """
+        row_bytes = len(blobs[0])
+        generation = self._sidecar_generation(model_type, dtype, start_new=True)
+        with self._sidecar_path(model_type, dtype).open("ab") as out:
+            size = out.tell()
+            if size % row_bytes:
+                # drop a torn row left by an interrupted write
+                size -= size % row_bytes
+                out.truncate(size)
+            out.write(b"".join(blobs))
+        return size // row_bytes, generation
 
     def list_faces(self) -> List[Tuple[int, str, bytes, str, str]]:
-        with self._lock, self._conn:
+        with self._lock:
             cur = self._conn.execute(
                 "SELECT id, photo_id, embedding, bbox, model_type FROM faces"
             )
             return cur.fetchall()
 
-    def update_group(self, face_id: int, group_id: str) -> None:
-        with self._lock, self._conn:
-            self._conn.execute(
-                "UPDATE faces SET group_id = ? WHERE id = ?", (group_id, face_id)
+    def list_model_types(self) -> List[str]:
+        with self._lock:
+            cur = self._conn.execute("SELECT DISTINCT model_type FROM faces")
+            return [row[0] for row in cur.fetchall()]
+
+    def load_embeddings_matrix(self, model_type: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (face_ids, embeddings) for one model_type: an int64 array of N ids
+        and a contiguous (N, D) matrix whose rows line up with them.
+        The matrix keeps the stored dtype (int8 for quantized embeddings, whose
+        rows are scaled per vector) and is widened to float32 if dtypes are mixed.
+        Rows come from the memory-mapped sidecar file when every face points
+        into its current generation and spot checks against the BLOBs pass;
+        otherwise from the BLOBs in SQLite, which stay the source of truth.
+        """
+        with self._lock:
+            cur = self._conn.execute(
+                "SELECT id, emb_row, emb_dtype, emb_gen FROM faces WHERE model_type = ? ORDER BY id",
+                (model_type,),
             )
+            rows = cur.fetchall()
+        face_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        if not rows:
+            return face_ids, np.empty((0, 0), dtype=np.float32)
+        mapped = self._mapped_rows(model_type, rows)
+        if mapped is not None:
+            return face_ids, mapped
+        return face_ids, self._load_embedding_blobs(model_type)
+
+    def _mapped_rows(
+        self,
+        model_type: str,
+        rows: List[Tuple[int, Optional[int], str, Optional[str]]],
+    ) -> Optional[np.ndarray]:
+        """
+        The sidecar rows for (id, emb_row, emb_dtype, emb_gen) rows, or None
+        when they cannot be trusted to match the BLOBs.
+        """
+        dtype = rows[0][2]
+        generation = self._sidecar_generation(model_type, dtype)
+        if generation is None or any(row[1] is None or row[2] != dtype or row[3] != generation for row in rows):
+            return None
+        sidecar = self._map_embeddings(model_type, dtype)
+        emb_rows = np.array([row[1] for row in rows], dtype=np.int64)
+        if sidecar is None or int(emb_rows.max()) >= sidecar.shape[0]:
+            return None
+        # cheap guard against a file that changed behind the generation id
+        with self._lock:
+            blobs = dict(
+                self._conn.execute(
+                    "SELECT id, embedding FROM faces WHERE id IN (?, ?)",
+                    (rows[0][0], rows[-1][0]),
+                ).fetchall()
+            )
+        for face_id, emb_row in ((rows[0][0], emb_rows[0]), (rows[-1][0], emb_rows[-1])):
+            if sidecar[emb_row].tobytes() != blobs.get(face_id):
+                return None
+        first = int(emb_rows[0])
+        if np.array_equal(emb_rows, np.arange(first, first + len(rows))):
+            return sidecar[first : first + len(rows)]
+        return sidecar[emb_rows]
+
+    def _map_embeddings(self, model_type: str, dtype: str) -> Optional[np.ndarray]:
+        path = self._sidecar_path(model_type, dtype)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT length(embedding) FROM faces WHERE model_type = ? AND emb_dtype = ? LIMIT 1",
+                (model_type, dtype),
+            ).fetchone()
+        if not row or not path.exists():
+            return None
+        item_dtype = np.dtype(dtype)
+        n_rows = path.stat().st_size // row[0]
+        if n_rows == 0:
+            return None
+        return np.memmap(path, dtype=item_dtype, mode="r", shape=(n_rows, row[0] // item_dtype.itemsize))
+
+    def _load_embedding_blobs(self, model_type: str) -> np.ndarray:
+        with self._lock:
+            cur = self._conn.execute(
+                "SELECT embedding, emb_dtype FROM faces WHERE model_type = ? ORDER BY id",
+                (model_type,),
+            )
+            rows = cur.fetchall()
+        dtypes = {row[1] for row in rows}
+        if len(dtypes) > 1:
+            embeddings = np.stack([np.frombuffer(row[0], dtype=row[1]) for row in rows])
+            return embeddings.astype(np.float32)
+        # one join + one frombuffer instead of decoding every BLOB separately
+        data = b"".join(row[0] for row in rows)
+        return np.frombuffer(data, dtype=dtypes.pop()).reshape(len(rows), -1)
+
+    def update_group(self, face_id: int, group_id: str) -> None:
+        with self._write():
+            self._conn.execute(_SQL_UPDATE_GROUP, (group_id, face_id))
+            self._groups_cache = None
 
     def clear_groups(self) -> None:
-        with self._lock, self._conn:
+        with self._write():
+            self._conn.execute("UPDATE faces SET group_id = NULL")
+            self._groups_cache = None
+
+    def replace_groups(self, assignments: Iterable[Tuple[int, str]]) -> None:
+        """
+        assignments: iterable of (face_id, group_id)
+        Clears every group and writes the new ones with one executemany.
+        """
+        with self._write():
             self._conn.execute("UPDATE faces SET group_id = NULL")
+            self._groups_cache = None
+            self._conn.executemany(
+                _SQL_UPDATE_GROUP,
+                ((group_id, face_id) for face_id, group_id in assignments),
+            )
 
     def list_groups(self) -> List[Tuple[str, int, str]]:
         """
         Returns list of (group_id, count, cover_photo_id)
         """
-        with self._lock, self._conn:
+        with self._lock:
             cur = self._conn.execute(
                 """
                 SELECT group_id, COUNT(*), MIN(photo_id)
@@ -110,12 +435,16 @@ class Database:
             )
             return cur.fetchall()
 
-    def list_groups_with_cover(self) -> List[Tuple[str, int, int, str, str]]:
+    def list_groups_with_cover(self) -> List[Tuple[str, int, int, str, Union[bytes, str]]]:
         """
-        Returns list of (group_id, photo_count, face_count, photo_id, bbox_json)
-        using the earliest face in each group as cover.
+        Returns list of (group_id, photo_count, face_count, photo_id, bbox)
+        using the earliest face in each group as cover; bbox is as stored
+        (see decode_bbox).
+        The result is cached until the groups change; treat it as read-only.
         """
-        with self._lock, self._conn:
+        with self._lock:
+            if self._groups_cache is not None:
+                return self._groups_cache
             cur = self._conn.execute(
                 """
                 WITH cover AS (
@@ -138,10 +467,24 @@ class Database:
                 ORDER BY counts.photo_count DESC
                 """
             )
-            return cur.fetchall()
+            self._groups_cache = cur.fetchall()
+            return self._groups_cache
+
+    def get_group_cover(self, group_id: str) -> Optional[Tuple[str, Union[bytes, str]]]:
+        """
+        Returns (photo_id, bbox) of the group's earliest face, matching the
+        cover chosen by list_groups_with_cover, or None if the group is empty.
+        """
+        with self._lock:
+            cur = self._conn.execute(
+                "SELECT photo_id, bbox FROM faces"
+                " WHERE id = (SELECT MIN(id) FROM faces WHERE group_id = ?)",
+                (group_id,),
+            )
+            return cur.fetchone()
 
     def list_group_photos(self, group_id: str) -> List[str]:
-        with self._lock, self._conn:
+        with self._lock:
             cur = self._conn.execute(
                 """
                 SELECT DISTINCT photo_id FROM faces
@@ -152,10 +495,8 @@ class Database:
             return [row[0] for row in cur.fetchall()]
 
     def get_photo_path(self, photo_id: str) -> Optional[str]:
-        with self._lock, self._conn:
-            cur = self._conn.execute(
-                "SELECT file_path FROM photos WHERE photo_id = ?", (photo_id,)
-            )
+        with self._lock:
+            cur = self._conn.execute(_SQL_PHOTO_PATH, (photo_id,))
             row = cur.fetchone()
             return row[0] if row else None
 
@@ -163,11 +504,8 @@ class Database:
         """
         Returns (file_path, orig_name) or None.
         """
-        with self._lock, self._conn:
-            cur = self._conn.execute(
-                "SELECT file_path, orig_name FROM photos WHERE photo_id = ?",
-                (photo_id,),
-            )
+        with self._lock:
+            cur = self._conn.execute(_SQL_PHOTO_META, (photo_id,))
             row = cur.fetchone()
             if not row:
                 return None
@@ -177,30 +515,36 @@ class Database:
         """
         Returns list of (photo_id, file_path, orig_name)
         """
-        with self._lock, self._conn:
+        with self._lock:
             cur = self._conn.execute(
                 "SELECT photo_id, file_path, orig_name FROM photos ORDER BY created_at"
             )
             return cur.fetchall()
 
     def photo_exists(self, photo_id: str) -> bool:
-        with self._lock, self._conn:
-            cur = self._conn.execute(
-                "SELECT 1 FROM photos WHERE photo_id = ? LIMIT 1", (photo_id,)
-            )
-            return cur.fetchone() is not None
+        photo_ids = self._photo_ids
+        if photo_ids is None:
+            photo_ids = self._load_photo_ids()
+        return photo_id in photo_ids
+
+    def _load_photo_ids(self) -> Set[str]:
+        with self._lock:
+            if self._photo_ids is None:
+                cur = self._conn.execute("SELECT photo_id FROM photos")
+                self._photo_ids = {row[0] for row in cur}
+            return self._photo_ids
 
     def count_stats(self) -> Tuple[int, int]:
         """
         Returns (total_photos, photos_no_face)
         """
-        with self._lock, self._conn:
+        with self._lock:
             cur = self._conn.execute("SELECT COUNT(*), SUM(no_face) FROM photos")
             total, no_face = cur.fetchone()
             return total or 0, no_face or 0
 
     def faces_count(self) -> int:
-        with self._lock, self._conn:
+        with self._lock:
             cur = self._conn.execute("SELECT COUNT(*) FROM faces")
             (count,) = cur.fetchone()
             return count or 0
@@ -209,14 +553,34 @@ class Database:
         """
         Cleanup database entries whose files were removed manually.
         """
-        with self._lock, self._conn:
-            cur = self._conn.execute("SELECT photo_id, file_path FROM photos")
-            to_delete = []
-            for photo_id, path in cur.fetchall():
-                if not Path(path).exists():
-                    to_delete.append(photo_id)
-            for pid in to_delete:
-                self._conn.execute("DELETE FROM photos WHERE photo_id = ?", (pid,))
+        with self._lock:
+            rows = self._conn.execute("SELECT photo_id, file_path FROM photos").fetchall()
+        # overlap the stat() calls; they dominate on network mounts
+        with ThreadPoolExecutor(max_workers=_STAT_WORKERS) as pool:
+            exists = list(pool.map(lambda row: Path(row[1]).exists(), rows))
+        to_delete = [row[0] for row, found in zip(rows, exists) if not found]
+        if not to_delete:
+            return
+        with self._write():
+            # stay well below SQLITE_MAX_VARIABLE_NUMBER per statement
+            for start in range(0, len(to_delete), _DELETE_BATCH):
+                batch = to_delete[start : start + _DELETE_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                self._conn.execute(f"DELETE FROM photos WHERE photo_id IN ({placeholders})", batch)
+            if self._photo_ids is not None:
+                self._photo_ids.difference_update(to_delete)
+            self._groups_cache = None
+
+    def optimize(self) -> None:
+        """
+        Refresh planner statistics after a bulk load so the indexes get used.
+        PRAGMA optimize only re-analyzes tables that were never analyzed or have
+        grown a lot since, so it is cheap to run after every batch; the analysis
+        limit caps the rows sampled per index when it does.
+        """
+        with self._write():
+            self._conn.execute("PRAGMA analysis_limit=1000")
+            self._conn.execute("PRAGMA optimize")
 
     def close(self) -> None:
         with self._lock:
@@ -1,13 +1,28 @@
 from __future__ import annotations
 
+import os
 import textwrap
 from dataclasses import dataclass
-from typing import List, Tuple
+from typing import Callable, List, Optional, Sequence, Tuple
 
 import numpy as np
 from PIL import Image
 
-from .config import get_thresholds
+from .config import DETECT_WORKERS, get_thresholds
+
+# Similarity-matrix elements computed per GEMM block (16 MiB of float32); the
+# rows per block shrink as N grows, so a block's temporaries stay this size.
+_BLOCK_ELEMENTS = 1 << 22
+# Elements of a block whose similar pairs are merged into the components at
+# once; caps the int64 pair arrays at 16 MiB even when every pair is similar.
+_UNION_ELEMENTS = 1 << 20
+# With faiss installed, sets at least this large are linked through an HNSW
+# index (each face against its nearest neighbours) instead of all pairs.
+_ANN_MIN_FACES = 50000
+_ANN_NEIGHBORS = 50
+_HNSW_M = 32
+# the default (40) leaves tight clusters split into a few islands
+_HNSW_EF_CONSTRUCTION = 80
 
 
 @dataclass
@@ -42,8 +57,11 @@ class FaceEngine:
         try:
             from insightface.app import FaceAnalysis  # type: ignore
 
-            app = FaceAnalysis()
-            app.prepare(ctx_id=0, det_size=(640, 640))
+            providers, ctx_id = self._onnx_providers()
+            app = FaceAnalysis(providers=providers)
+            app.prepare(ctx_id=ctx_id, det_size=(640, 640))
+            if ctx_id < 0:
+                self._share_cpu_threads(app, providers)
             self._engine = app
             self.model_type = "insightface"
             return
@@ -63,6 +81,55 @@ class FaceEngine:
         self._engine = "face_recognition"
         self._init_error = None
 
+    @staticmethod
+    def _onnx_providers() -> Tuple[List[str], int]:
+        """
+        Returns (providers, ctx_id): CUDA when onnxruntime offers it, else CPU.
+        """
+        try:
+            import onnxruntime  # type: ignore
+
+            available = onnxruntime.get_available_providers()
+        except Exception:  # noqa: BLE001
+            available = []
+        if "CUDAExecutionProvider" in available:
+            return ["CUDAExecutionProvider", "CPUExecutionProvider"], 0
+        return ["CPUExecutionProvider"], -1
+
+    def warmup(self) -> None:
+        """
+        Run one detection on a blank image, so lazy per-session allocations
+        (ONNX Runtime arenas, CUDA kernels) happen now instead of on the first photo.
+        """
+        if not self.available:
+            return
+        try:
+            self.detect_and_embed(Image.new("RGB", (320, 320)))
+        except Exception:  # noqa: BLE001
+            pass
+
+    @staticmethod
+    def _share_cpu_threads(app, providers: List[str]) -> None:
+        """
+        ONNX Runtime gives every session an intra-op pool sized to all cores, and
+        DETECT_WORKERS photos run inference at once, which oversubscribes the CPU.
+        insightface takes no SessionOptions, so recreate its sessions with each
+        limited to its share of the cores; keep the defaults if that fails.
+        """
+        try:
+            import onnxruntime  # type: ignore
+
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = max(1, (os.cpu_count() or 1) // DETECT_WORKERS)
+            sessions = {
+                name: onnxruntime.InferenceSession(model.model_file, sess_options=options, providers=providers)
+                for name, model in app.models.items()
+            }
+        except Exception:  # noqa: BLE001
+            return
+        for name, session in sessions.items():
+            app.models[name].session = session
+
     def detect_and_embed(self, image: Image.Image) -> List[DetectedFace]:
         if not self.available or not self.model_type:
             return []
@@ -74,38 +141,41 @@ class FaceEngine:
         return []
 
     def _detect_insightface(self, image: Image.Image) -> List[DetectedFace]:
-        import numpy as np
-
-        arr = np.asarray(image.convert("RGB"))
+        arr = _rgb_array(image)
         faces = self._engine.get(arr)
-        results: List[DetectedFace] = []
-        for face in faces:
-            embedding = np.array(face["embedding"], dtype="float32")
-            # normalize to keep cosine similarity stable
-            norm = np.linalg.norm(embedding)
-            if norm > 0:
-                embedding = embedding / norm
-            bbox = tuple(int(v) for v in face.bbox.astype(int).tolist())
-            results.append(DetectedFace(embedding=embedding, bbox=bbox, model_type="insightface"))
-        return results
+        if not faces:
+            return []
+        # normalize all embeddings in one pass to keep cosine similarity stable
+        embeddings = np.asarray([face["embedding"] for face in faces], dtype=np.float32)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True).clip(min=1e-12)
+        quantized = quantize_sq8(embeddings)
+        return [
+            DetectedFace(
+                embedding=quantized[i],
+                bbox=tuple(int(v) for v in face.bbox.astype(int).tolist()),
+                model_type="insightface",
+            )
+            for i, face in enumerate(faces)
+        ]
 
     def _detect_face_recognition(self, image: Image.Image) -> List[DetectedFace]:
         import face_recognition
 
-        arr = np.asarray(image.convert("RGB"))
+        arr = _rgb_array(image)
         boxes = face_recognition.face_locations(arr)
-        encodings = face_recognition.face_encodings(arr, boxes)
-        results: List[DetectedFace] = []
-        for bbox, enc in zip(boxes, encodings):
-            top, right, bottom, left = bbox
-            results.append(
-                DetectedFace(
-                    embedding=np.array(enc, dtype="float32"),
-                    bbox=(left, top, right, bottom),
-                    model_type="face_recognition",
-                )
+        if not boxes:
+            return []
+        # dlib encodings are compared by euclidean distance, so they are not
+        # normalized; float16 halves storage and is widened again for clustering
+        encodings = np.asarray(face_recognition.face_encodings(arr, boxes), dtype=np.float16)
+        return [
+            DetectedFace(
+                embedding=encodings[i],
+                bbox=(left, top, right, bottom),
+                model_type="face_recognition",
             )
-        return results
+            for i, (top, right, bottom, left) in enumerate(boxes)
+        ]
 
     def cluster(
         self,
@@ -124,58 +194,72 @@ class FaceEngine:
         for fid, emb, model in faces:
             by_model.setdefault(model, []).append((fid, emb))
 
-        insightface_threshold, facerec_threshold = get_thresholds()
         for model, items in by_model.items():
-            if model == "face_recognition":
-                assignments.extend(self._cluster_euclidean(items, facerec_threshold))
-            else:
-                assignments.extend(self._cluster_cosine(items, insightface_threshold))
+            face_ids = [fid for fid, _ in items]
+            embeddings = np.stack([emb for _, emb in items])
+            assignments.extend(self.cluster_matrix(face_ids, embeddings, model))
         return assignments
 
+    def cluster_matrix(
+        self,
+        face_ids: Sequence[int],
+        embeddings: np.ndarray,
+        model_type: str,
+    ) -> List[Tuple[int, str]]:
+        """
+        face_ids: N face ids, one per row of embeddings
+        embeddings: (N, D) matrix produced by model_type
+        Returns list of (face_id, group_id)
+        """
+        if len(face_ids) == 0:
+            return []
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        insightface_threshold, facerec_threshold = get_thresholds()
+        if model_type == "face_recognition":
+            return self._cluster_euclidean(face_ids, embeddings, facerec_threshold)
+        return self._cluster_cosine(face_ids, embeddings, insightface_threshold)
+
+    @staticmethod
+    def _cluster_cosine(face_ids: Sequence[int], embeddings: np.ndarray, threshold: float) -> List[Tuple[int, str]]:
+        # one reciprocal per row, then a multiply per element instead of a divide
+        inv_norms = 1.0 / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        embeddings = embeddings * inv_norms
+        roots = _ann_components(embeddings, "inner_product", lambda scores: scores >= threshold)
+        if roots is None:
+            roots = _similar_components(embeddings, lambda block, start: block @ embeddings[start:].T >= threshold)
+        return FaceEngine._assign_groups(face_ids, roots)
+
     @staticmethod
-    def _cluster_cosine(items: List[Tuple[int, np.ndarray]], threshold: float) -> List[Tuple[int, str]]:
-        clusters: List[Tuple[str, np.ndarray, int]] = []  # (group_id, centroid, count)
-        results: List[Tuple[int, str]] = []
-        for face_id, emb in items:
-            if emb.ndim == 1:
-                norm = np.linalg.norm(emb)
-                if norm > 0:
-                    emb = emb / norm
-            assigned = False
-            for idx, (gid, centroid, count) in enumerate(clusters):
-                sim = float(np.dot(emb, centroid))
-                if sim >= threshold:
-                    # update centroid incremental
-                    new_centroid = (centroid * count + emb) / (count + 1)
-                    clusters[idx] = (gid, new_centroid, count + 1)
-                    results.append((face_id, gid))
-                    assigned = True
-                    break
-            if not assigned:
-                gid = FaceEngine._new_group_id()
-                clusters.append((gid, emb, 1))
-                results.append((face_id, gid))
-        return results
+    def _cluster_euclidean(face_ids: Sequence[int], embeddings: np.ndarray, threshold: float) -> List[Tuple[int, str]]:
+        sq_norms = np.einsum("ij,ij->i", embeddings, embeddings)
+        threshold_sq = threshold * threshold
+
+        def within(block: np.ndarray, start: int) -> np.ndarray:
+            # |a - b|^2 = |a|^2 + |b|^2 - 2 a.b, compared against the squared threshold
+            # built in place on the GEMM output to avoid extra BLOCK x N temporaries
+            stop = start + block.shape[0]
+            dists = block @ embeddings[start:].T
+            dists *= -2.0
+            dists += sq_norms[None, start:]
+            dists += sq_norms[start:stop, None]
+            return dists <= threshold_sq
+
+        # faiss L2 indexes report squared distances
+        roots = _ann_components(embeddings, "l2", lambda scores: scores <= threshold_sq)
+        if roots is None:
+            roots = _similar_components(embeddings, within)
+        return FaceEngine._assign_groups(face_ids, roots)
 
     @staticmethod
-    def _cluster_euclidean(items: List[Tuple[int, np.ndarray]], threshold: float) -> List[Tuple[int, str]]:
-        clusters: List[Tuple[str, np.ndarray, int]] = []
-        results: List[Tuple[int, str]] = []
-        for face_id, emb in items:
-            assigned = False
-            for idx, (gid, centroid, count) in enumerate(clusters):
-                dist = float(np.linalg.norm(emb - centroid))
-                if dist <= threshold:
-                    new_centroid = (centroid * count + emb) / (count + 1)
-                    clusters[idx] = (gid, new_centroid, count + 1)
-                    results.append((face_id, gid))
-                    assigned = True
-                    break
-            if not assigned:
-                gid = FaceEngine._new_group_id()
-                clusters.append((gid, emb, 1))
-                results.append((face_id, gid))
-        return results
+    def _assign_groups(face_ids: Sequence[int], roots: np.ndarray) -> List[Tuple[int, str]]:
+        """
+        Faces with the same component root (linked directly or transitively by
+        similar pairs) share a group.
+        """
+        labels = np.unique(roots, return_inverse=True)[1]
+        gids = [FaceEngine._new_group_id() for _ in range(int(labels.max()) + 1)]
+        # tolist() turns numpy ids back into plain ints that sqlite3 can bind
+        return [(fid, gids[label]) for fid, label in zip(np.asarray(face_ids).tolist(), labels.tolist())]
 
     @staticmethod
     def _new_group_id() -> str:
@@ -202,3 +286,110 @@ class FaceEngine:
             Windows: install CMake and Visual Studio Build Tools, then pip install face_recognition
             """
         ).strip()
+
+
+def _rgb_array(image: Image.Image) -> np.ndarray:
+    """
+    View an image as an (H, W, 3) uint8 array, converting only when the mode
+    is not already RGB (convert() always copies the whole image).
+    """
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    return np.asarray(image)
+
+
+def quantize_sq8(embeddings: np.ndarray) -> np.ndarray:
+    """
+    Symmetric int8 quantization with one scale per row (max |value| -> 127).
+    Only the direction of each row survives, which is all cosine similarity
+    needs; it stores a 512-d InsightFace embedding in 512 bytes instead of 2 KB.
+    """
+    embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+    scale = 127.0 / np.abs(embeddings).max(axis=1, keepdims=True).clip(min=1e-12)
+    return np.round(embeddings * scale).clip(-127, 127).astype(np.int8)
+
+
+def _similar_components(
+    embeddings: np.ndarray,
+    within: Callable[[np.ndarray, int], np.ndarray],
+) -> np.ndarray:
+    """
+    Component root of every row, linking rows i < j for which within() holds.
+    within(block, start) gets embeddings[start:start + len(block)] and returns a
+    boolean matrix against embeddings[start:], so only the upper triangle of the
+    all-pairs matrix is ever computed. Blocks hold a fixed number of elements
+    and their pairs are merged into the roots right away, so working memory
+    beyond the O(N) roots does not grow with N.
+    """
+    n = embeddings.shape[0]
+    block_rows = max(1, _BLOCK_ELEMENTS // n)
+    union_rows = max(1, _UNION_ELEMENTS // n)
+    roots = np.arange(n)
+    for start in range(0, n, block_rows):
+        block = embeddings[start : start + block_rows]
+        similar = within(block, start)
+        # merge a few rows at a time: one dense row can link to every face
+        for offset in range(0, similar.shape[0], union_rows):
+            r, c = np.nonzero(similar[offset : offset + union_rows])
+            r += offset
+            # columns are offset by start too; drop the diagonal and the lower
+            # half of the square block it sits in
+            upper = c > r
+            _union_pairs(roots, r[upper] + start, c[upper] + start)
+    return roots
+
+
+def _ann_components(
+    embeddings: np.ndarray,
+    metric: str,
+    keep: Callable[[np.ndarray], np.ndarray],
+) -> Optional[np.ndarray]:
+    """
+    Component root of every row, linking each face to those of its approximate
+    nearest neighbours for which keep(scores) holds, using a faiss HNSW index.
+    Returns None when faiss is not installed or the set is small enough for
+    the exact all-pairs path.
+    """
+    n, dim = embeddings.shape
+    if n < _ANN_MIN_FACES:
+        return None
+    try:
+        import faiss  # type: ignore
+    except Exception:  # noqa: BLE001
+        return None
+
+    metric_type = faiss.METRIC_INNER_PRODUCT if metric == "inner_product" else faiss.METRIC_L2
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    index = faiss.IndexHNSWFlat(dim, _HNSW_M, metric_type)
+    index.hnsw.efConstruction = _HNSW_EF_CONSTRUCTION
+    index.hnsw.efSearch = 2 * _ANN_NEIGHBORS
+    index.add(embeddings)
+    scores, neighbors = index.search(embeddings, min(_ANN_NEIGHBORS, n))
+    # a face missing from another's neighbour list is usually still reached
+    # through the faces between them, since groups are connected components
+    mask = (neighbors >= 0) & keep(scores)
+    roots = np.arange(n)
+    _union_pairs(roots, np.nonzero(mask)[0], neighbors[mask])
+    return roots
+
+
+def _union_pairs(roots: np.ndarray, a: np.ndarray, b: np.ndarray) -> None:
+    """
+    Merge the components of every pair (a[i], b[i]) into roots, in place.
+    roots is kept flat (roots[x] is the smallest index in x's component), so
+    each round is a few vectorized passes: hook every differing root pair onto
+    the smaller root, then pointer-jump until every entry names a root again.
+    """
+    while True:
+        ra = roots[a]
+        rb = roots[b]
+        differ = ra != rb
+        if not differ.any():
+            return
+        a, b, ra, rb = a[differ], b[differ], ra[differ], rb[differ]
+        np.minimum.at(roots, np.maximum(ra, rb), np.minimum(ra, rb))
+        while True:
+            jumped = roots[roots]
+            if np.array_equal(jumped, roots):
+                break
+            roots[:] = jumped
@@ -1,21 +1,27 @@
 from __future__ import annotations
 
 import asyncio
+import contextlib
+import functools
 import json
 import hashlib
+import importlib.util
 import io
+import os
 import shutil
 import sys
 import threading
+import time
+import uuid
 import webbrowser
 import zipfile
 from pathlib import Path
-from typing import List, Optional
+from typing import BinaryIO, Callable, Iterator, List, Optional, Tuple
 
 import uvicorn
 import traceback
 from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
-from fastapi.responses import FileResponse, HTMLResponse, StreamingResponse
+from fastapi.responses import FileResponse, HTMLResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from PIL import Image
@@ -23,19 +29,31 @@ from PIL import Image
 from .config import (
     DEFAULT_THUMB_WIDTH,
     PHOTOS_DIR,
-    TMP_DIR,
+    THUMB_CACHE_MAX_FILES,
+    THUMBS_DIR,
     DB_PATH,
     ensure_dirs,
     get_thresholds,
     set_threshold,
 )
-from .database import Database
+from .database import Database, decode_bbox
 from .face_engine import FaceEngine
 from .tasks import PhotoJob, PhotoProcessor
 
 
+def _warm_engine() -> None:
+    # in the background, so startup is not held up by the first inference
+    threading.Thread(target=face_engine.warmup, name="engine-warmup", daemon=True).start()
+
+
+@contextlib.asynccontextmanager
+async def _lifespan(_app: FastAPI):
+    _warm_engine()
+    yield
+
+
 ensure_dirs()
-app = FastAPI(title="Face Photo Search", version="0.1.0")
+app = FastAPI(title="Face Photo Search", version="0.1.0", lifespan=_lifespan)
 templates = Jinja2Templates(directory=str(Path(__file__).parent / "templates"))
 app.mount("/static", StaticFiles(directory=str(Path(__file__).parent / "static")), name="static")
 
@@ -72,6 +90,80 @@ async def index(request: Request) -> HTMLResponse:
     )
 
 
+_UPLOAD_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+_UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+# uploads copied at once across all requests; each holds an open file and a worker thread
+_UPLOAD_CONCURRENCY = 8
+_upload_slots = asyncio.Semaphore(_UPLOAD_CONCURRENCY)
+_ZIP_CHUNK_SIZE = 1024 * 1024
+
+
+def _iter_chunks(src: BinaryIO) -> Iterator[bytes]:
+    """
+    Yield src in _UPLOAD_CHUNK_SIZE pieces. When src supports readinto()
+    (SpooledTemporaryFile does from Python 3.11) one buffer is reused and each
+    piece is a view into it, valid only until the next one is requested.
+    """
+    readinto = getattr(src, "readinto", None)
+    if readinto is None:
+        while True:
+            chunk = src.read(_UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+    buffer = memoryview(bytearray(_UPLOAD_CHUNK_SIZE))
+    while True:
+        n = readinto(buffer)
+        if not n:
+            return
+        yield buffer[:n]
+
+
+def _store_upload(src: BinaryIO, ext: str) -> Tuple[str, Path]:
+    """
+    Copy an upload into PHOTOS_DIR under its content hash; returns (photo_id, path).
+    Blocking: reads, hashes and writes in the calling thread.
+    """
+    # hash while writing next to the final location, then rename in place
+    partial_path = PHOTOS_DIR / f".uploading_{uuid.uuid4().hex}{ext}"
+    # photo ids have always been SHA-1 of the content; a different hash would make
+    # existing libraries re-import every photo on the next upload of the folder
+    hasher = hashlib.sha1()
+    try:
+        with partial_path.open("wb") as out:
+            for chunk in _iter_chunks(src):
+                hasher.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        partial_path.unlink(missing_ok=True)
+        raise
+    photo_id = hasher.hexdigest()
+    dest_path = PHOTOS_DIR / f"{photo_id}{ext}"
+    if not dest_path.exists():
+        os.replace(partial_path, dest_path)
+    else:
+        partial_path.unlink(missing_ok=True)
+    return photo_id, dest_path
+
+
+async def _save_one(file: UploadFile) -> Optional[PhotoJob]:
+    """
+    Store one upload under its content hash; returns a job if the photo is new.
+    """
+    # Only basic image filter by extension
+    ext = Path(file.filename or "").suffix.lower()
+    if ext not in _UPLOAD_EXTENSIONS:
+        return None
+    # the spooled upload is already on the server; copy it in one worker-thread call
+    async with _upload_slots:
+        photo_id, dest_path = await asyncio.to_thread(_store_upload, file.file, ext)
+
+    if db.photo_exists(photo_id):
+        return None
+    orig_name = Path(file.filename or dest_path.name).name
+    return PhotoJob(photo_id=photo_id, file_path=dest_path, orig_name=orig_name)
+
+
 @app.post("/api/upload-folder")
 async def upload_folder(files: List[UploadFile] = File(...)) -> dict:
     if not files:
@@ -79,38 +171,13 @@ async def upload_folder(files: List[UploadFile] = File(...)) -> dict:
     if not face_engine.available:
         raise HTTPException(status_code=500, detail=face_engine.error_message or "Face engine not available")
 
-    jobs: List[PhotoJob] = []
-    saved = 0
-    for file in files:
-        # Only basic image filter by extension
-        ext = Path(file.filename or "").suffix.lower()
-        if ext not in {".jpg", ".jpeg", ".png", ".bmp", ".webp"}:
-            continue
-        tmp_path = TMP_DIR / f"upload_{hashlib.sha1(file.filename.encode('utf-8')).hexdigest()}{ext}"
-        hasher = hashlib.sha1()
-        with tmp_path.open("wb") as out:
-            while True:
-                chunk = await file.read(1024 * 1024)
-                if not chunk:
-                    break
-                hasher.update(chunk)
-                out.write(chunk)
-        photo_id = hasher.hexdigest()
-        dest_path = PHOTOS_DIR / f"{photo_id}{ext}"
-        if not dest_path.exists():
-            shutil.move(str(tmp_path), dest_path)
-        else:
-            tmp_path.unlink(missing_ok=True)
-
-        if db.photo_exists(photo_id):
-            continue
-        orig_name = Path(file.filename or dest_path.name).name
-        jobs.append(PhotoJob(photo_id=photo_id, file_path=dest_path, orig_name=orig_name))
-        saved += 1
+    results = await asyncio.gather(*(_save_one(file) for file in files))
+    # identical files in one batch hash to the same photo; queue it once
+    jobs: List[PhotoJob] = list({job.photo_id: job for job in results if job}.values())
 
     if jobs:
         processor.enqueue(jobs)
-    return {"accepted": saved, "message": "Processing queued", "queued_jobs": len(jobs)}
+    return {"accepted": len(jobs), "message": "Processing queued", "queued_jobs": len(jobs)}
 
 
 @app.get("/api/status")
@@ -129,21 +196,24 @@ async def status() -> dict:
     }
 
 
+def _group_entry(gid: str, photo_cnt: int, face_cnt: int, pid: str, stored_bbox) -> dict:
+    bbox = list(decode_bbox(stored_bbox) or [])
+    return {
+        "group_id": gid,
+        "photo_count": photo_cnt,
+        "face_count": face_cnt,
+        "cover_photo_id": pid,
+        # keep the JSON-text shape the API had before bboxes were packed
+        "cover_bbox": json.dumps(bbox),
+        # crop URL carrying the face itself, so fetching it needs no group lookup
+        "cover_url": f"/api/face-crop/{pid}?bbox={','.join(map(str, bbox))}",
+    }
+
+
 @app.get("/api/groups")
 async def groups() -> dict:
     items = db.list_groups_with_cover()
-    return {
-        "groups": [
-            {
-                "group_id": gid,
-                "photo_count": photo_cnt,
-                "face_count": face_cnt,
-                "cover_photo_id": pid,
-                "cover_bbox": bbox,
-            }
-            for gid, photo_cnt, face_cnt, pid, bbox in items
-        ]
-    }
+    return {"groups": [_group_entry(*item) for item in items]}
 
 
 @app.get("/api/groups/{group_id}")
@@ -154,19 +224,122 @@ async def group_detail(group_id: str) -> dict:
     return {"group_id": group_id, "photos": photos}
 
 
-def _read_image(photo_path: Path, width: Optional[int]) -> bytes:
+def _read_image(photo_path: Path, width: Optional[int]) -> Optional[bytes]:
+    """
+    Returns a JPEG scaled down to width, or None when the original is not wider
+    (only the header is read then, so the caller can send the file as is).
+    """
     with Image.open(photo_path) as im:
-        if width and width > 0 and im.width > width:
-            ratio = width / float(im.width)
-            height = int(im.height * ratio)
-            im = im.resize((width, height))
+        if not width or width <= 0 or im.width <= width:
+            return None
+        # let libjpeg scale down while decoding (1/2, 1/4, 1/8); no-op for other formats
+        im.draft("RGB", (width, width))
+        im.thumbnail((width, im.height), Image.BILINEAR)
+        if im.mode not in ("RGB", "L"):
+            im = im.convert("RGB")
         buf = io.BytesIO()
-        im.save(buf, format="JPEG")
+        im.save(buf, format="JPEG", quality=85)
         return buf.getvalue()
 
 
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+# cache hits refresh mtime at most this often, and pruning spares files this
+# recent: they were just written or hit, so a response may be about to send them
+_TOUCH_AFTER_SECONDS = 3600
+
+
+def _prune_thumbs() -> None:
+    """
+    Keep the thumbnail cache bounded, dropping the least recently used files
+    (hits refresh mtime, so mtime order is LRU order).
+    """
+    entries = []
+    for path in THUMBS_DIR.rglob("*.jpg"):
+        try:
+            entries.append((path.stat().st_mtime, path))
+        except FileNotFoundError:
+            continue
+    excess = len(entries) - THUMB_CACHE_MAX_FILES
+    if excess <= 0:
+        return
+    entries.sort()
+    for _, path in entries[:excess]:
+        # re-check: a hit may have touched the file since the listing above
+        try:
+            if time.time() - path.stat().st_mtime < _TOUCH_AFTER_SECONDS:
+                continue
+        except FileNotFoundError:
+            continue
+        path.unlink(missing_ok=True)
+
+
+def _touch_cached(path: Path) -> bool:
+    """
+    Marks a cache hit for LRU pruning; False when the file is gone (a miss).
+    """
+    try:
+        if time.time() - path.stat().st_mtime >= _TOUCH_AFTER_SECONDS:
+            os.utime(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+# new cache entries between thumbnail cache size checks
+_PRUNE_EVERY_WRITES = 256
+_thumb_writes = 0
+_IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+async def _cached_render(cache_path: Path, render: Callable[[], Optional[bytes]]) -> Optional[Path]:
+    """
+    Returns cache_path, rendering it on a miss; None when render() has nothing to cache.
+    """
+    global _thumb_writes  # noqa: PLW0603
+    if await asyncio.to_thread(_touch_cached, cache_path):
+        return cache_path
+    data = await asyncio.to_thread(render)
+    if data is None:
+        return None
+    await asyncio.to_thread(_write_atomic, cache_path, data)
+    _thumb_writes += 1
+    if _thumb_writes % _PRUNE_EVERY_WRITES == 0:
+        asyncio.get_running_loop().run_in_executor(None, _prune_thumbs)
+    return cache_path
+
+
+def _not_modified(request: Request, etag: str) -> Optional[Response]:
+    """
+    Returns a 304 response when the client's If-None-Match already names etag.
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    if etag in tags or "*" in tags:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": _IMMUTABLE})
+    return None
+
+
+class _OriginalFileResponse(FileResponse):
+    """
+    FileResponse for full-size photos. uvicorn has no sendfile path, so each
+    chunk is a threaded read plus a socket write; 1 MiB chunks (Starlette uses
+    64 KiB) cut those round trips 16x. Servers offering the ASGI pathsend
+    extension still get zero-copy, since Starlette hands them the path.
+    """
+
+    chunk_size = 1024 * 1024
+
+
 @app.get("/api/photo/{photo_id}")
-async def photo(photo_id: str, w: Optional[int] = None, download: bool = False):
+async def photo(request: Request, photo_id: str, w: Optional[int] = None, download: bool = False):
     meta = db.get_photo_meta(photo_id)
     if not meta:
         raise HTTPException(status_code=404, detail="Photo not found")
@@ -177,55 +350,162 @@ async def photo(photo_id: str, w: Optional[int] = None, download: bool = False):
 
     if download:
         download_name = Path(orig_name).name if orig_name else photo_path.name
-        return FileResponse(photo_path, filename=download_name)
-
-    if not w:
-        return FileResponse(photo_path)
-    data = await asyncio.to_thread(_read_image, photo_path, int(w))
-    return StreamingResponse(io.BytesIO(data), media_type="image/jpeg")
+        return _OriginalFileResponse(photo_path, filename=download_name)
+
+    width = int(w) if w else 0
+    # photo_id is a content hash, so neither the original nor a thumbnail goes stale
+    etag = f'"{photo_id}-{width}"'
+    not_modified = _not_modified(request, etag)
+    if not_modified:
+        return not_modified
+    headers = {"Cache-Control": _IMMUTABLE, "ETag": etag}
+    if not width:
+        return _OriginalFileResponse(photo_path, headers=headers)
+    thumb_path = await _cached_render(
+        THUMBS_DIR / str(width) / f"{photo_id}.jpg",
+        functools.partial(_read_image, photo_path, width),
+    )
+    if thumb_path is None:
+        # no downscale needed: skip decode/re-encode and send the original
+        return _OriginalFileResponse(photo_path, headers=headers)
+    return FileResponse(thumb_path, media_type="image/jpeg", headers=headers)
 
 
-def _read_face_crop(photo_path: Path, bbox_json: str, width: Optional[int]) -> bytes:
-    try:
-        bbox = json.loads(bbox_json) if bbox_json else None
-    except Exception:
-        bbox = None
+def _read_face_crop(photo_path: Path, bbox: Optional[Tuple[int, int, int, int]], width: Optional[int]) -> bytes:
     with Image.open(photo_path) as im:
-        if bbox and len(bbox) == 4:
+        full_width, full_height = im.size
+        if bbox:
             x1, y1, x2, y2 = bbox
             # expand a bit to include more context
             dx = int((x2 - x1) * 0.2)
             dy = int((y2 - y1) * 0.2)
             left = max(0, x1 - dx)
             top = max(0, y1 - dy)
-            right = min(im.width, x2 + dx)
-            bottom = min(im.height, y2 + dy)
-            face = im.crop((left, top, right, bottom))
+            right = min(full_width, x2 + dx)
+            bottom = min(full_height, y2 + dy)
+            if right <= left or bottom <= top:
+                # box lies outside the photo; show the whole photo instead
+                left, top, right, bottom = 0, 0, full_width, full_height
         else:
-            face = im
+            left, top, right, bottom = 0, 0, full_width, full_height
+        if width and width > 0 and right - left > width:
+            # decode only as large as the crop needs (JPEG DCT scaling, no-op otherwise)
+            scale = width / float(right - left)
+            im.draft("RGB", (max(1, int(full_width * scale)), max(1, int(full_height * scale))))
+        # the bbox is in full-resolution pixels; map it onto the drafted image
+        sx = im.width / float(full_width)
+        sy = im.height / float(full_height)
+        crop_left, crop_top = int(left * sx), int(top * sy)
+        # keep at least one pixel when a tiny box shrinks with the draft
+        crop_right = max(crop_left + 1, int(right * sx))
+        crop_bottom = max(crop_top + 1, int(bottom * sy))
+        face = im.crop((crop_left, crop_top, crop_right, crop_bottom))
         if width and width > 0 and face.width > width:
             ratio = width / float(face.width)
-            height = int(face.height * ratio)
-            face = face.resize((width, height))
+            height = max(1, int(face.height * ratio))
+            face = face.resize((width, height), Image.BILINEAR)
+        if face.mode not in ("RGB", "L"):
+            face = face.convert("RGB")
         buf = io.BytesIO()
         face.save(buf, format="JPEG")
         return buf.getvalue()
 
 
+async def _face_crop_response(
+    request: Request,
+    photo_id: str,
+    bbox: Optional[Tuple[int, int, int, int]],
+    width: Optional[int],
+):
+    path_str = db.get_photo_path(photo_id)
+    if not path_str:
+        raise HTTPException(status_code=404, detail="Photo not found")
+    # keyed by the face itself, so the crop survives reclustering (group ids change)
+    face_key = hashlib.blake2b(f"{photo_id}:{bbox}".encode("utf-8"), digest_size=16).hexdigest()
+    # group ids are new on every regrouping, and the tag follows the face anyway
+    etag = f'"{face_key}-{width or 0}"'
+    not_modified = _not_modified(request, etag)
+    if not_modified:
+        return not_modified
+    crop_path = await _cached_render(
+        THUMBS_DIR / "faces" / str(width or 0) / f"{face_key}.jpg",
+        functools.partial(_read_face_crop, Path(path_str), bbox, width),
+    )
+    return FileResponse(
+        crop_path,
+        media_type="image/jpeg",
+        headers={"Cache-Control": _IMMUTABLE, "ETag": etag},
+    )
+
+
 @app.get("/api/face-cover/{group_id}")
-async def face_cover(group_id: str, w: Optional[int] = None):
+async def face_cover(request: Request, group_id: str, w: Optional[int] = None):
     # pick first face in group as cover
-    items = db.list_groups_with_cover()
-    record = next((r for r in items if r[0] == group_id), None)
+    record = db.get_group_cover(group_id)
     if not record:
         raise HTTPException(status_code=404, detail="Group not found")
-    # record: (group_id, photo_count, face_count, photo_id, bbox_json)
-    _, _, _, photo_id, bbox = record
-    path_str = db.get_photo_path(photo_id)
-    if not path_str:
-        raise HTTPException(status_code=404, detail="Photo not found")
-    data = await asyncio.to_thread(_read_face_crop, Path(path_str), bbox, int(w) if w else None)
-    return StreamingResponse(io.BytesIO(data), media_type="image/jpeg")
+    photo_id, stored_bbox = record
+    return await _face_crop_response(request, photo_id, decode_bbox(stored_bbox), int(w) if w else None)
+
+
+@app.get("/api/face-crop/{photo_id}")
+async def face_crop(request: Request, photo_id: str, bbox: str = "", w: Optional[int] = None):
+    """
+    Crop a face given as bbox=x1,y1,x2,y2 (empty for the whole photo); this is
+    the cover_url /api/groups hands out.
+    """
+    face_bbox = None
+    if bbox:
+        try:
+            coords = tuple(int(v) for v in bbox.split(","))
+        except ValueError:
+            coords = ()
+        if len(coords) != 4 or coords[0] >= coords[2] or coords[1] >= coords[3]:
+            raise HTTPException(status_code=400, detail="bbox must be x1,y1,x2,y2 with x1 < x2 and y1 < y2")
+        face_bbox = coords
+    return await _face_crop_response(request, photo_id, face_bbox, int(w) if w else None)
+
+
+class _ZipSink(io.RawIOBase):
+    """
+    Write-only, unseekable target for ZipFile; output is collected until drained.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _iter_zip(entries: List[Tuple[Path, str]]) -> Iterator[bytes]:
+    """
+    Yield a ZIP_STORED archive of (path, arcname) entries as it is written,
+    holding at most one read chunk in memory.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as zf:
+        for photo_path, arcname in entries:
+            info = zipfile.ZipInfo.from_file(photo_path, arcname=arcname)
+            with photo_path.open("rb") as src, zf.open(info, "w") as dst:
+                while True:
+                    chunk = src.read(_ZIP_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()
 
 
 @app.get("/api/groups/{group_id}/zip")
@@ -234,26 +514,26 @@ async def group_zip(group_id: str):
     if not photos:
         raise HTTPException(status_code=404, detail="Group not found")
 
-    buffer = io.BytesIO()
-    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as zf:
-        for pid in photos:
-            meta = db.get_photo_meta(pid)
-            if not meta:
-                continue
-            path_str, orig_name = meta
-            photo_path = Path(path_str)
-            if not photo_path.exists():
-                continue
-            arcname = Path(orig_name).name if orig_name else photo_path.name
-            try:
-                zf.write(photo_path, arcname=arcname)
-            except ValueError:
-                # Fallback if duplicate names; still keep readable
-                zf.write(photo_path, arcname=f"{photo_path.stem}_{pid[:6]}{photo_path.suffix}")
-    buffer.seek(0)
+    entries: List[Tuple[Path, str]] = []
+    used_names = set()
+    for pid in photos:
+        meta = db.get_photo_meta(pid)
+        if not meta:
+            continue
+        path_str, orig_name = meta
+        photo_path = Path(path_str)
+        if not photo_path.exists():
+            continue
+        arcname = Path(orig_name).name if orig_name else photo_path.name
+        if arcname in used_names:
+            # Fallback if duplicate names; still keep readable
+            arcname = f"{Path(arcname).stem}_{pid[:6]}{photo_path.suffix}"
+        used_names.add(arcname)
+        entries.append((photo_path, arcname))
     filename = f"group_{group_id[:6]}.zip"
+    # sync generator: Starlette iterates it in a worker thread
     return StreamingResponse(
-        buffer,
+        _iter_zip(entries),
         media_type="application/zip",
         headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
@@ -281,24 +561,28 @@ async def update_settings(
 @app.post("/api/clear-cache")
 async def clear_cache() -> dict:
     global db, processor, face_engine  # noqa: PLW0603
-    # stop any running tasks is omitted; best-effort clear files/db
+    # drop queued photos first; then best-effort clear files/db
     try:
+        processor.close()
         try:
             db.close()
         except Exception:
             pass
         if DB_PATH.exists():
             DB_PATH.unlink()
+        shutil.rmtree(db.embeddings_dir, ignore_errors=True)
         if PHOTOS_DIR.exists():
             for p in PHOTOS_DIR.glob("*"):
                 if p.is_file():
                     p.unlink()
+        shutil.rmtree(THUMBS_DIR, ignore_errors=True)
     finally:
         # re-init DB to allow continued use without restart
         ensure_dirs()
         db = Database()
         face_engine = FaceEngine()
         processor = PhotoProcessor(db=db, engine=face_engine)
+        _warm_engine()
     return {"message": "Cache cleared. Please re-upload or re-analyze."}
 
 
@@ -324,9 +608,23 @@ def _open_browser() -> None:
         pass
 
 
+def _server_options() -> dict:
+    """
+    Prefer the uvloop event loop and httptools parser (both shipped with
+    uvicorn[standard]) and fall back to asyncio/h11 when they are missing.
+    """
+    return {
+        "loop": "uvloop" if importlib.util.find_spec("uvloop") else "asyncio",
+        "http": "httptools" if importlib.util.find_spec("httptools") else "h11",
+    }
+
+
 def main() -> None:
     threading.Timer(1.0, _open_browser).start()
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=False)
+    # Single worker on purpose: the processing queue, its status and the face
+    # engine live in this process. Image resizing runs in worker threads, so
+    # it does not block the event loop.
+    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=False, workers=1, **_server_options())
 
 
 if __name__ == "__main__":
@@ -1,17 +1,16 @@
 from __future__ import annotations
 
-import json
 import queue
 import threading
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 from pathlib import Path
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
-import numpy as np
 from PIL import Image
 
-from .database import Database
-from .face_engine import FaceEngine
+from .config import DETECT_MAX_SIDE, DETECT_WORKERS
+from .database import Database, encode_bbox
+from .face_engine import DetectedFace, FaceEngine
 
 
 @dataclass
@@ -33,100 +32,188 @@ class TaskStatus:
 
 
 class PhotoProcessor:
+    """
+    Jobs are queued one by one and detected by DETECT_WORKERS threads. A
+    single writer thread stores the results in batched transactions and
+    reclusters once the queue has drained.
+    """
+
     def __init__(self, db: Database, engine: FaceEngine) -> None:
         self.db = db
         self.engine = engine
-        self.queue: "queue.SimpleQueue[List[PhotoJob]]" = queue.SimpleQueue()
+        # None is the stop sentinel, one per detect worker (see close())
+        self.queue: "queue.Queue[Optional[PhotoJob]]" = queue.Queue()
         self.status = TaskStatus()
-        self._thread = threading.Thread(target=self._worker, daemon=True)
-        self._thread.start()
+        # (job, (width, height, faces)) or (job, exception) from the detect
+        # workers, and None from each worker as it stops
+        self._results: "queue.SimpleQueue[Optional[Tuple[PhotoJob, object]]]" = queue.SimpleQueue()
+        # guards status and _pending, which API handlers and all workers touch
+        self._status_lock = threading.Lock()
+        self._pending = 0
+        self._closed = False
+        self._workers = [
+            threading.Thread(target=self._detect_worker, name=f"detect-{i}", daemon=True)
+            for i in range(DETECT_WORKERS)
+        ]
+        self._workers.append(threading.Thread(target=self._writer, name="store", daemon=True))
+        for thread in self._workers:
+            thread.start()
 
     def enqueue(self, jobs: List[PhotoJob]) -> None:
         if not jobs:
             return
-        self.queue.put(jobs)
-
-    def _reset_status(self, total: int) -> None:
-        self.status = TaskStatus(state="running", total=total, processed=0)
-
-    def _worker(self) -> None:
-        while True:
-            jobs = self.queue.get()
-            if not jobs:
-                continue
-            self._process_jobs(jobs)
-
-    def _process_jobs(self, jobs: List[PhotoJob]) -> None:
         if not self.engine.available:
             self.status = TaskStatus(
                 state="error",
                 error=self.engine.error_message or "No face engine available",
             )
             return
+        with self._status_lock:
+            if self._pending == 0:
+                self._reset_status(total=len(jobs))
+            else:
+                # photos queued while a run is active join that run
+                self.status.total += len(jobs)
+            self._pending += len(jobs)
+        for job in jobs:
+            self.queue.put(job)
+
+    def close(self) -> None:
+        """
+        Stop the worker threads. Queued photos are dropped; photos already being
+        detected finish, but their results are discarded instead of stored.
+        """
+        self._closed = True
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+        for _ in range(DETECT_WORKERS):
+            self.queue.put(None)
 
-        self._reset_status(total=len(jobs))
-        try:
-            for job in jobs:
+    def _reset_status(self, total: int) -> None:
+        self.status = TaskStatus(state="running", total=total, processed=0)
+
+    def _detect_worker(self) -> None:
+        while True:
+            job = self.queue.get()
+            if job is None:
+                self._results.put(None)
+                return
+            with self._status_lock:
                 self.status.current = job.orig_name
-                self._process_single(job)
-                self.status.processed += 1
+            try:
+                result: object = self._detect(job)
+            except Exception as exc:  # noqa: BLE001
+                result = exc
+            self._results.put((job, result))
+
+    def _writer(self) -> None:
+        running = DETECT_WORKERS
+        while running:
+            batch = [self._results.get()]
+            # take whatever else is ready so it shares one transaction
+            while True:
+                try:
+                    batch.append(self._results.get_nowait())
+                except queue.Empty:
+                    break
+            results = [item for item in batch if item is not None]
+            running -= len(batch) - len(results)
+            if results and not self._closed:
+                self._store_batch(results)
+
+    def _store_batch(self, batch: List[Tuple[PhotoJob, object]]) -> None:
+        errors: List[str] = []
+        try:
+            with self.db.transaction():
+                for job, result in batch:
+                    if isinstance(result, Exception):
+                        errors.append(f"{job.orig_name}: {result}")
+                        continue
+                    self._store(job, *result)
+        except Exception as exc:  # noqa: BLE001
+            errors.append(str(exc))
+        with self._status_lock:
+            self.status.processed += len(batch)
+            if errors:
+                self.status.error = errors[-1]
+            self._pending -= len(batch)
+            drained = self._pending == 0
+        if drained:
+            self._finish()
+
+    def _finish(self) -> None:
+        try:
             # recluster all faces
-            self._cluster_all()
-            self.status.state = "done"
+            with self.db.transaction():
+                self._cluster_all()
+            self.db.optimize()
             total_photos, photos_no_face = self.db.count_stats()
-            self.status.photos_no_face = photos_no_face
-            self.status.faces_found = self.db.faces_count()
+            faces_found = self.db.faces_count()
+            with self._status_lock:
+                if self._pending:
+                    # more photos arrived meanwhile; the next drain finishes the run
+                    return
+                self.status.photos_no_face = photos_no_face
+                self.status.faces_found = faces_found
+                self.status.state = "error" if self.status.error else "done"
         except Exception as exc:  # noqa: BLE001
-            self.status = TaskStatus(state="error", error=str(exc))
-
-    def _process_single(self, job: PhotoJob) -> None:
+            with self._status_lock:
+                self.status = TaskStatus(state="error", error=str(exc))
+
+    def _detect(self, job: PhotoJob) -> Tuple[int, int, List[DetectedFace]]:
+        """
+        Decode one photo and run the face engine; returns (width, height, faces).
+        Touches no shared state, so it is safe to run on any detect worker.
+        """
         with Image.open(job.file_path) as im:
-            image = im.convert("RGB")
-            width, height = image.size
+            width, height = im.size
+            if 0 < DETECT_MAX_SIDE < max(width, height):
+                # let libjpeg decode at 1/2..1/8 scale; the detector runs at 640 px anyway
+                scale = DETECT_MAX_SIDE / max(width, height)
+                im.draft("RGB", (int(width * scale), int(height * scale)))
+            # convert() copies the whole image even when it is already RGB
+            image = im if im.mode == "RGB" else im.convert("RGB")
             faces = self.engine.detect_and_embed(image)
-            if faces:
-                face_rows = []
-                for face in faces:
-                    bbox_json = json.dumps(face.bbox)
-                    face_rows.append(
-                        (
-                            face.embedding.astype("float32").tobytes(),
-                            bbox_json,
-                            face.model_type,
-                        )
+            if image.size != (width, height):
+                # report boxes in original pixels, which is what crops are cut from
+                sx = width / image.width
+                sy = height / image.height
+                faces = [
+                    replace(
+                        face,
+                        bbox=(round(face.bbox[0] * sx), round(face.bbox[1] * sy),
+                              round(face.bbox[2] * sx), round(face.bbox[3] * sy)),
                     )
-                self.db.add_photo(
-                    job.photo_id,
-                    str(job.file_path),
-                    job.orig_name,
-                    width,
-                    height,
-                    no_face=False,
-                )
-                self.db.add_faces(job.photo_id, face_rows)
-            else:
-                self.db.add_photo(
-                    job.photo_id,
-                    str(job.file_path),
-                    job.orig_name,
-                    width,
-                    height,
-                    no_face=True,
-                )
+                    for face in faces
+                ]
+            return width, height, faces
+
+    def _store(self, job: PhotoJob, width: int, height: int, faces: List[DetectedFace]) -> None:
+        face_rows = [
+            (
+                job.photo_id,
+                face.embedding.tobytes(),
+                encode_bbox(face.bbox),
+                face.model_type,
+                face.embedding.dtype.name,
+            )
+            for face in faces
+        ]
+        self.db.bulk_ingest(
+            [(job.photo_id, str(job.file_path), job.orig_name, width, height, not faces)],
+            face_rows,
+        )
+        if not faces:
+            with self._status_lock:
                 self.status.photos_no_face += 1
 
     def _cluster_all(self) -> None:
-        faces_rows = self.db.list_faces()
-        # faces_rows: (id, photo_id, embedding_bytes, bbox_json, model_type)
-        parsed: List[tuple[int, np.ndarray, str]] = []
-        for row in faces_rows:
-            face_id, _, emb_bytes, _, model_type = row
-            emb = np.frombuffer(emb_bytes, dtype="float32")
-            parsed.append((face_id, emb, model_type))
-
-        # clear existing groups and reassign
-        self.db.clear_groups()
-        assignments = self.engine.cluster(parsed)
-        for face_id, group_id in assignments:
-            self.db.update_group(face_id, group_id)
-
+        # recluster one embedding matrix per model, then replace all groups at once
+        assignments: List[Tuple[int, str]] = []
+        for model_type in self.db.list_model_types():
+            face_ids, embeddings = self.db.load_embeddings_matrix(model_type)
+            assignments.extend(self.engine.cluster_matrix(face_ids, embeddings, model_type))
+        self.db.replace_groups(assignments)